@@ -2,8 +2,16 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import os
+import hashlib
+import tempfile
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np # For numerical operations and NaN handling
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -16,66 +24,201 @@ st.title("📊 ChronicCare Analytics Dashboard")
 st.markdown("---")
 
 # --- Data Loading (Cached for performance) ---
-@st.cache_data
+# Explicit Arrow column types for the columns the dashboard reads, so the CSV parser skips
+# type inference on them. Other columns are inferred and never abort the load.
+# Columns missing from a file are simply ignored by the reader.
+# Low-cardinality columns are dictionary-encoded so pandas receives them as
+# categoricals and groupby/isin work on integer codes rather than strings.
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+CSV_SCHEMAS = {
+    "users": {
+        "user_id": pa.string(),
+        "condition": CATEGORY,
+        "gender": CATEGORY,
+    },
+    "ml_engagement_training_data": {
+        "user_id": pa.string(),
+        "avg_steps": pa.float64(),
+        "dropout_risk": pa.float64(),
+    },
+    "clinical_sessions": {
+        "user_id": pa.string(),
+        "session_date": pa.string(), # Parsed in parse_dates so bad values are dropped, not fatal
+        "session_type": CATEGORY,
+        "outcome_score": pa.float64(),
+        "nps_score": pa.float64(),
+    },
+    "ai_alerts": {
+        "user_id": pa.string(),
+        "alert_date": pa.string(), # Parsed in parse_dates so bad values are dropped, not fatal
+        "alert_type": CATEGORY,
+        "resolved": pa.bool_(), # Accepts 0/1 as well as true/false, like stg_alerts' resolved::boolean
+    },
+}
+
+# Date columns that must be present for a row to be usable
+REQUIRED_DATE_COLUMNS = {
+    "clinical_sessions": "session_date",
+    "ai_alerts": "alert_date",
+}
+
+
+# ISO-8601 date, optionally followed by a time ("T" or space separated, seconds, fraction and offset optional)
+ISO_DAY_PATTERN = (
+    r"^(?P<date>\d{4}-\d{1,2}-(?P<day>\d{1,2}))"
+    r"(?:[T ](?:[01]?\d|2[0-3]):[0-5]\d(?::[0-5]\d(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?$"
+)
+
+def parse_dates(strings):
+    # Accepts ISO-8601 dates and timestamps, truncated to the calendar day the dashboard works in.
+    # Anything else (including ambiguous forms like 06/01/2024) becomes null and its row is dropped.
+    parts = pc.extract_regex(strings, ISO_DAY_PATTERN)
+    parsed = pc.strptime(pc.struct_field(parts, "date"), format="%Y-%m-%d", unit="ns", error_is_null=True)
+    # strptime rolls impossible dates forward (2024-06-31 -> 2024-07-01); null those out by checking the day survived
+    day = pc.cast(pc.struct_field(parts, "day"), pa.int64())
+    return pc.if_else(pc.equal(pc.day(parsed), day), parsed, pa.scalar(None, parsed.type))
+
+
+def read_csv_arrow(csv_path, name):
+    # Multi-threaded Arrow CSV parser
+    table = pacsv.read_csv(
+        csv_path,
+        parse_options=pacsv.ParseOptions(),
+        convert_options=pacsv.ConvertOptions(column_types=CSV_SCHEMAS[name]),
+    )
+    # A blank flag counts as False, so the column stays bool in pandas and sums to an integer count
+    for col, col_type in CSV_SCHEMAS[name].items():
+        if col_type == pa.bool_() and col in table.column_names:
+            table = table.set_column(table.column_names.index(col), col, pc.fill_null(table[col], False))
+    # Parse the required date inside Arrow and drop rows without a valid date, instead of pandas to_datetime + dropna
+    date_col = REQUIRED_DATE_COLUMNS.get(name)
+    if date_col in table.column_names:
+        table = table.set_column(table.column_names.index(date_col), date_col, parse_dates(table[date_col]))
+        table = table.filter(pc.is_valid(table[date_col]))
+    return table
+
+
+def write_parquet_atomic(table, parquet_path):
+    # Write to a temp file in the same directory and rename it into place, so an interrupted
+    # write never leaves a partial Parquet file for the next start to trip over
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=parquet_path.parent, prefix=f".{parquet_path.stem}.", suffix=".tmp")
+    except OSError:
+        return # Read-only data directory: keep serving from CSV
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pq.write_table(table, f, compression="zstd", use_dictionary=True)
+        os.chmod(tmp_path, 0o644) # mkstemp creates 0600; keep the copy readable like the CSVs
+        os.replace(tmp_path, parquet_path)
+    except OSError:
+        Path(tmp_path).unlink(missing_ok=True)
+
+def read_table(base_path, name):
+    # Serve a sibling Parquet copy when it is newer than the CSV, otherwise parse the CSV once and write it
+    csv_path = base_path / f"{name}.csv"
+    parquet_path = csv_path.with_suffix(".parquet")
+    # The CSV stat raises FileNotFoundError if the source file is missing.
+    # This file's mtime is included so schema edits above invalidate stale Parquet copies.
+    source_mtime = max(csv_path.stat().st_mtime, Path(__file__).stat().st_mtime)
+
+    table = None
+    if parquet_path.exists() and parquet_path.stat().st_mtime >= source_mtime:
+        try:
+            table = pq.read_table(parquet_path)
+        except (OSError, pa.ArrowException):
+            pass # Truncated or corrupt copy: treat as a cache miss and reparse the CSV
+    if table is None:
+        table = read_csv_arrow(csv_path, name)
+        write_parquet_atomic(table, parquet_path)
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+
+    # Arrow dictionaries follow first-appearance order; sort them so groupby output stays alphabetical
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories))
+    return df
+
+
+# Held as shared, read-only objects: cache_resource hands every caller the same frames,
+# where cache_data would unpickle a fresh copy of the full dataset on each access
+@st.cache_resource
 def load_data():
     base_path = Path("data") # Assumes data folder is sibling to app.py, adjust if app.py is in a subfolder
 
     try:
-        users = pd.read_csv(base_path / "users.csv")
-        engagement = pd.read_csv(base_path / "ml_engagement_training_data.csv")
-        sessions = pd.read_csv(base_path / "clinical_sessions.csv")
-        alerts = pd.read_csv(base_path / "ai_alerts.csv")
-
-        # --- Initial Data Cleaning/Preparation ---
-        # Ensure user_id is consistent for merging if needed across files
-        # Convert date columns to datetime objects
-        if 'session_date' in sessions.columns:
-            sessions['session_date'] = pd.to_datetime(sessions['session_date'], errors='coerce')
-        if 'alert_date' in alerts.columns:
-            alerts['alert_date'] = pd.to_datetime(alerts['alert_date'], errors='coerce')
-        if 'date' in engagement.columns: # Assuming engagement might have a date column
-            engagement['date'] = pd.to_datetime(engagement['date'], errors='coerce')
-
-        # Drop rows with NaT (Not a Time) values if conversion failed
-        sessions.dropna(subset=['session_date'], inplace=True)
-        alerts.dropna(subset=['alert_date'], inplace=True)
-        
-        return users, engagement, sessions, alerts
+        # Arrow releases the GIL while reading, so the four files load concurrently
+        table_names = ["users", "ml_engagement_training_data", "clinical_sessions", "ai_alerts"]
+        with ThreadPoolExecutor(max_workers=len(table_names)) as executor:
+            users, engagement, sessions, alerts = executor.map(lambda name: read_table(base_path, name), table_names)
+
+        # Categorize dropout risk once for better visualization, rather than on every rerun
+        if 'dropout_risk' in engagement.columns:
+            bins = [0, 0.25, 0.5, 0.75, 1.0]
+            labels = ['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk']
+            engagement['risk_category'] = pd.cut(engagement['dropout_risk'], bins=bins, labels=labels, right=False)
+
+        # Sort by date once so date-range filters can binary search instead of scanning
+        sessions = sessions.sort_values('session_date', kind='stable', ignore_index=True)
+        alerts = alerts.sort_values('alert_date', kind='stable', ignore_index=True)
+
+        # Factorize user_id once so per-rerun user filtering is an integer gather instead of isin
+        user_index = pd.Categorical(users['user_id']).categories
+        for df in (users, engagement, sessions, alerts):
+            df['uid_code'] = user_index.get_indexer(df['user_id']).astype(np.int32) # -1 for users not in users.csv
+
+        # Attach each row's user condition once with a gather on the user code, instead of merging on every rerun
+        known_users = users[users['uid_code'] >= 0].drop_duplicates('uid_code').sort_values('uid_code')
+        condition_by_code = known_users['condition'].values
+        for df in (engagement, alerts):
+            df['condition'] = condition_by_code.take(df['uid_code'].values, allow_fill=True) # NaN for unknown users
+
+        # Sidebar option lists, computed once per process instead of on every rerun
+        options = {'condition': sorted(users['condition'].unique().tolist())}
+        if 'gender' in users.columns:
+            options['gender'] = sorted(users['gender'].unique().tolist())
+        if 'alert_type' in alerts.columns:
+            options['alert_type'] = sorted(alerts['alert_type'].unique().tolist())
+        # Date columns are already NaT-free datetime64[ns] from the reader, so the bounds need no conversion
+        options['date_range'] = (
+            min(sessions['session_date'].min(), alerts['alert_date'].min()),
+            max(sessions['session_date'].max(), alerts['alert_date'].max()),
+        )
+
+        return users, engagement, sessions, alerts, options
     except FileNotFoundError as e:
-        st.error(f"Required data file not found: {e.filename}. Please ensure all CSVs are in the 'data/' directory.")
+        st.error(f"Required data file not found: {e.filename or e}. Please ensure all CSVs are in the 'data/' directory.")
         st.stop()
     except Exception as e:
         st.error(f"An error occurred during data loading: {e}. Please check your CSV file contents.")
         st.stop()
 
-users_orig, engagement_orig, sessions_orig, alerts_orig = load_data()
+users_orig, engagement_orig, sessions_orig, alerts_orig, filter_options = load_data()
 
 # --- Sidebar Filters ---
 st.sidebar.header("Filter Dashboard Data")
 
 # Condition Filter
-condition_options = ["All"] + sorted(users_orig['condition'].unique().tolist())
+condition_options = ["All"] + filter_options['condition']
 selected_condition = st.sidebar.selectbox("Condition", options=condition_options)
 
 # Gender Filter (assuming 'gender' column exists in users.csv)
-if 'gender' in users_orig.columns:
-    gender_options = ["All"] + sorted(users_orig['gender'].unique().tolist())
+if 'gender' in filter_options:
+    gender_options = ["All"] + filter_options['gender']
     selected_gender = st.sidebar.selectbox("Gender", options=gender_options)
 else:
     selected_gender = "All"
     st.sidebar.info("Gender filter not available (column missing).")
 
 # Alert Type Filter (assuming 'alert_type' column exists in ai_alerts.csv)
-if 'alert_type' in alerts_orig.columns:
-    alert_type_options = ["All"] + sorted(alerts_orig['alert_type'].unique().tolist())
+if 'alert_type' in filter_options:
+    alert_type_options = ["All"] + filter_options['alert_type']
     selected_alert_type = st.sidebar.selectbox("Alert Type", options=alert_type_options)
 else:
     selected_alert_type = "All"
     st.sidebar.info("Alert Type filter not available (column missing).")
 
 # Date Range Filter (for sessions and alerts)
-min_date_val = min(sessions_orig['session_date'].min(), alerts_orig['alert_date'].min())
-max_date_val = max(sessions_orig['session_date'].max(), alerts_orig['alert_date'].max())
+min_date_val, max_date_val = filter_options['date_range']
 
 date_range = st.sidebar.date_input(
     "Date Range",
@@ -89,42 +232,231 @@ if len(date_range) == 2:
     start_date = pd.to_datetime(date_range[0])
     end_date = pd.to_datetime(date_range[1]) + pd.Timedelta(days=1) # Include the end date
 else:
-    start_date = pd.to_datetime(min_date_val)
-    end_date = pd.to_datetime(max_date_val) + pd.Timedelta(days=1)
-
-
-# --- Apply Global Filters ---
-# Start with copies of original dataframes to avoid modifying cached data
-filtered_users = users_orig.copy()
-filtered_engagement = engagement_orig.copy()
-filtered_sessions = sessions_orig.copy()
-filtered_alerts = alerts_orig.copy()
-
-# Filter users based on condition and gender
-if selected_condition != "All":
-    filtered_users = filtered_users[filtered_users['condition'] == selected_condition]
-if selected_gender != "All" and 'gender' in filtered_users.columns:
-    filtered_users = filtered_users[filtered_users['gender'] == selected_gender]
-
-# Filter other dataframes based on user_ids present in filtered_users
-user_ids_in_filter = filtered_users['user_id'].unique()
-filtered_engagement = filtered_engagement[filtered_engagement['user_id'].isin(user_ids_in_filter)]
-filtered_sessions = filtered_sessions[filtered_sessions['user_id'].isin(user_ids_in_filter)]
-filtered_alerts = filtered_alerts[filtered_alerts['user_id'].isin(user_ids_in_filter)]
-
-# Apply date range filter to sessions and alerts
-filtered_sessions = filtered_sessions[
-    (filtered_sessions['session_date'] >= start_date) &
-    (filtered_sessions['session_date'] < end_date)
-]
-filtered_alerts = filtered_alerts[
-    (filtered_alerts['alert_date'] >= start_date) &
-    (filtered_alerts['alert_date'] < end_date)
-]
-
-# Apply Alert Type filter
-if selected_alert_type != "All" and 'alert_type' in filtered_alerts.columns:
-    filtered_alerts = filtered_alerts[filtered_alerts['alert_type'] == selected_alert_type]
+    start_date = min_date_val
+    end_date = max_date_val + pd.Timedelta(days=1)
+
+
+# --- Apply Global Filters (Cached per filter selection) ---
+# Filters are composed as numpy boolean masks and applied once per dataframe.
+# The filtered frames are shared across summaries and sessions like the loaded data, so treat them as read-only.
+# Every per-filter cache keeps at most this many filter combinations
+FILTER_CACHE_ENTRIES = 32
+
+@st.cache_resource(max_entries=FILTER_CACHE_ENTRIES)
+def filter_data(selected_condition, selected_gender, selected_alert_type, start_date, end_date):
+    users_orig, engagement_orig, sessions_orig, alerts_orig, _ = load_data()
+
+    # Filter users based on condition and gender
+    user_mask = np.ones(len(users_orig), dtype=bool)
+    if selected_condition != "All":
+        user_mask &= (users_orig['condition'].values == selected_condition)
+    if selected_gender != "All" and 'gender' in users_orig.columns:
+        user_mask &= (users_orig['gender'].values == selected_gender)
+    filtered_users = users_orig[user_mask]
+
+    # Filter other dataframes based on user codes present in filtered_users
+    # The trailing slot is never set, so the -1 code of unknown users maps to False
+    user_code_mask = np.zeros(len(users_orig) + 1, dtype=bool)
+    user_code_mask[users_orig['uid_code'].values[user_mask]] = True
+    filtered_engagement = engagement_orig[user_code_mask[engagement_orig['uid_code'].values]]
+
+    # Apply date range filter to sessions and alerts
+    # Both are sorted by date in load_data, so the range is a binary-searched slice
+    date_bounds = [start_date.to_datetime64(), end_date.to_datetime64()]
+    lo, hi = np.searchsorted(sessions_orig['session_date'].values, date_bounds)
+    sessions_in_range = sessions_orig.iloc[lo:hi]
+    filtered_sessions = sessions_in_range[user_code_mask[sessions_in_range['uid_code'].values]]
+
+    lo, hi = np.searchsorted(alerts_orig['alert_date'].values, date_bounds)
+    alerts_in_range = alerts_orig.iloc[lo:hi]
+    alert_mask = user_code_mask[alerts_in_range['uid_code'].values]
+
+    # Apply Alert Type filter
+    if selected_alert_type != "All" and 'alert_type' in alerts_orig.columns:
+        alert_mask &= (alerts_in_range['alert_type'].values == selected_alert_type)
+    filtered_alerts = alerts_in_range[alert_mask]
+
+    return filtered_users, filtered_engagement, filtered_sessions, filtered_alerts
+
+
+# --- Cached Aggregations ---
+# Each summary is keyed only on the filter selection, so revisiting a filter combination skips the pandas work
+def aggregate_kpis(df, spec):
+    # One DataFrame.agg call over the KPI columns present; a missing column or an empty frame reports 0
+    present = {col: func for col, func in spec.items() if col in df.columns}
+    values = df.agg(present) if present and not df.empty else pd.Series(dtype=float)
+    return {col: values.get(col, 0) for col in spec}
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_kpis(*filters):
+    filtered_users, filtered_engagement, filtered_sessions, filtered_alerts = filter_data(*filters)
+
+    # Distinct users are counted on the int32 uid_code rather than hashing user_id strings;
+    # filtered frames only contain known users, so the counts are identical
+    engagement_kpis = aggregate_kpis(filtered_engagement, {'uid_code': 'nunique', 'avg_steps': 'mean'})
+    session_kpis = aggregate_kpis(filtered_sessions, {'outcome_score': 'mean', 'nps_score': 'mean'})
+    alert_kpis = aggregate_kpis(filtered_alerts, {'resolved': 'sum'})
+
+    kpis = {
+        'total_users': filtered_users.shape[0],
+        'total_active_users': int(engagement_kpis['uid_code']),
+        'total_sessions': filtered_sessions.shape[0],
+        'total_alerts': filtered_alerts.shape[0],
+        'avg_steps': engagement_kpis['avg_steps'],
+        'avg_outcome_score': session_kpis['outcome_score'],
+        'avg_nps_score': session_kpis['nps_score'],
+    }
+
+    # Calculate overall alert resolution rate
+    kpis['alert_resolution_rate'] = (alert_kpis['resolved'] / kpis['total_alerts'] * 100) if kpis['total_alerts'] > 0 else 0
+    return kpis
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_condition_counts(*filters):
+    filtered_users = filter_data(*filters)[0]
+    condition_counts = filtered_users['condition'].value_counts()[lambda counts: counts > 0].reset_index() # Drop categories filtered out
+    condition_counts.columns = ['Condition', 'Count']
+    return condition_counts
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_gender_counts(*filters):
+    filtered_users = filter_data(*filters)[0]
+    gender_counts = filtered_users['gender'].value_counts()[lambda counts: counts > 0].reset_index()
+    gender_counts.columns = ['Gender', 'Count']
+    return gender_counts
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_steps_histogram(*filters):
+    filtered_engagement = filter_data(*filters)[1]
+    # Bin once in numpy so Plotly draws prepared bars instead of rebinning the raw column
+    counts, edges = np.histogram(filtered_engagement['avg_steps'].dropna().values, bins=30)
+    return pd.DataFrame({'avg_steps': (edges[:-1] + edges[1:]) / 2, 'count': counts})
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_risk_counts(*filters):
+    filtered_engagement = filter_data(*filters)[1]
+    # risk_category comes from pd.cut in load_data as an ordered categorical, so sort=False keeps the label order
+    return filtered_engagement['risk_category'].value_counts(sort=False).rename_axis('Risk Category').reset_index(name='Count')
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_engagement_by_condition(*filters):
+    filtered_engagement = filter_data(*filters)[1]
+
+    # The user condition is attached to engagement rows in load_data
+    if filtered_engagement.empty or 'avg_steps' not in filtered_engagement.columns or 'dropout_risk' not in filtered_engagement.columns:
+        return None
+
+    return filtered_engagement.groupby('condition', observed=True).agg(
+        avg_steps=('avg_steps', 'mean'),
+        avg_dropout_risk=('dropout_risk', 'mean'),
+        user_count=('uid_code', 'nunique')
+    ).reset_index()
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_session_types(*filters):
+    filtered_sessions = filter_data(*filters)[2]
+    sess_summary = filtered_sessions.groupby("session_type", observed=True).agg({
+        "outcome_score": "mean",
+        "nps_score": "mean",
+        "uid_code": "nunique" # Count users per session type
+    }).reset_index()
+    sess_summary.columns = ["session_type", "Average Outcome Score", "Average NPS Score", "Unique Users"]
+    return sess_summary
+
+def count_per_day(dates):
+    # Truncate to calendar days in numpy and count, avoiding the overhead of a pd.Grouper
+    days = dates.values.astype('datetime64[D]').astype('datetime64[ns]')
+    daily_counts = pd.Series(days).value_counts().sort_index()
+    # Keep the zero-count days between the first and last date, as the daily resample did
+    full_range = pd.date_range(daily_counts.index[0], daily_counts.index[-1], freq='D')
+    return daily_counts.reindex(full_range, fill_value=0).rename_axis(dates.name).reset_index(name='Count')
+
+# The daily trend charts are about this many pixels wide, so extra points would never be visible
+TREND_MAX_POINTS = 1000
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: indices of n_out points that preserve the visual shape of the line
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+
+    # The first and last points are always kept; the interior is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        # Pick the bucket point forming the largest triangle with the last kept point and the next bucket's mean
+        area = np.abs((x[selected] - next_x) * (y[lo:hi] - y[selected]) - (x[selected] - x[lo:hi]) * (next_y - y[selected]))
+        selected = lo + int(np.argmax(area))
+        keep[i + 1] = selected
+    return keep
+
+def downsample_trend(daily_counts):
+    x = daily_counts.iloc[:, 0].values.view('i8').astype(np.float64)
+    y = daily_counts['Count'].values.astype(np.float64)
+    return daily_counts.iloc[lttb(x, y, TREND_MAX_POINTS)].reset_index(drop=True)
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_sessions_daily(*filters):
+    filtered_sessions = filter_data(*filters)[2]
+    return downsample_trend(count_per_day(filtered_sessions['session_date']))
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_alert_types(*filters):
+    filtered_alerts = filter_data(*filters)[3]
+    alerts_summary = filtered_alerts.groupby("alert_type", observed=True).agg(
+        total_alerts=("user_id", "count"), # Count total alerts
+        resolved_alerts=("resolved", "sum") # Sum of resolved (assuming 'resolved' is 0/1)
+    ).reset_index()
+    alerts_summary['resolution_rate'] = (alerts_summary['resolved_alerts'] / alerts_summary['total_alerts'] * 100)
+    return alerts_summary
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_alerts_daily(*filters):
+    filtered_alerts = filter_data(*filters)[3]
+    return downsample_trend(count_per_day(filtered_alerts['alert_date']))
+
+@st.cache_data(max_entries=FILTER_CACHE_ENTRIES)
+def summarize_alerts_by_condition(*filters):
+    filtered_alerts = filter_data(*filters)[3]
+
+    # The user condition is attached to alert rows in load_data
+    if filtered_alerts.empty or 'condition' not in filtered_alerts.columns:
+        return None
+
+    alert_counts_by_condition = filtered_alerts.groupby('condition', observed=True)['user_id'].count().reset_index()
+    alert_counts_by_condition.columns = ['Condition', 'Total Alerts']
+    return alert_counts_by_condition
+
+
+# --- Cached Figures ---
+# Plotly figure construction is keyed on a content hash of the (small) summary frame,
+# so an unchanged summary reuses the figure built on an earlier rerun
+def summary_key(df):
+    # Digest the row hashes in order, so reordered rows (e.g. a different sort) build a new figure
+    return tuple(df.columns), hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+# The tabs below draw this many cached figures per filter combination; keep them for as many
+# combinations as the summary caches hold, so revisiting a cached filter never rebuilds its figures
+FIGURES_PER_VIEW = 13
+
+@st.cache_resource(max_entries=FIGURES_PER_VIEW * FILTER_CACHE_ENTRIES)
+def build_figure(key, kind, _data, texttemplate=None, layout=None, **kwargs):
+    fig = getattr(px, kind)(_data, **kwargs)
+    if texttemplate is not None:
+        fig.update_traces(texttemplate=texttemplate, textposition='outside')
+    if layout is not None:
+        fig.update_layout(**layout)
+    return fig
+
+
+filters = (selected_condition, selected_gender, selected_alert_type, start_date, end_date)
+filtered_users, filtered_engagement, filtered_sessions, filtered_alerts = filter_data(*filters)
 
 
 # --- Check if data remains after filtering ---
@@ -145,30 +477,19 @@ with tab1:
     st.header("Overall Performance & Key Metrics")
 
     # KPIs
-    total_users_kpi = filtered_users.shape[0]
-    total_active_users_kpi = filtered_engagement['user_id'].nunique()
-    total_sessions_kpi = filtered_sessions.shape[0]
-    total_alerts_kpi = filtered_alerts.shape[0]
-
-    avg_steps_kpi = filtered_engagement['avg_steps'].mean() if not filtered_engagement.empty and 'avg_steps' in filtered_engagement.columns else 0
-    avg_outcome_score_kpi = filtered_sessions['outcome_score'].mean() if not filtered_sessions.empty and 'outcome_score' in filtered_sessions.columns else 0
-    avg_nps_score_kpi = filtered_sessions['nps_score'].mean() if not filtered_sessions.empty and 'nps_score' in filtered_sessions.columns else 0
-    
-    # Calculate overall alert resolution rate
-    total_resolved_alerts = filtered_alerts['resolved'].sum() if 'resolved' in filtered_alerts.columns else 0
-    alert_resolution_rate_kpi = (total_resolved_alerts / total_alerts_kpi * 100) if total_alerts_kpi > 0 else 0
+    kpis = summarize_kpis(*filters)
 
     col_kpi1, col_kpi2, col_kpi3, col_kpi4 = st.columns(4)
-    col_kpi1.metric("Total Users", f"{total_users_kpi:,}")
-    col_kpi2.metric("Active Users (in Engagement)", f"{total_active_users_kpi:,}")
-    col_kpi3.metric("Avg Daily Steps", f"{int(avg_steps_kpi):,}")
-    col_kpi4.metric("Avg Session Outcome Score", f"{avg_outcome_score_kpi:.1f}")
+    col_kpi1.metric("Total Users", f"{kpis['total_users']:,}")
+    col_kpi2.metric("Active Users (in Engagement)", f"{kpis['total_active_users']:,}")
+    col_kpi3.metric("Avg Daily Steps", f"{int(kpis['avg_steps']):,}")
+    col_kpi4.metric("Avg Session Outcome Score", f"{kpis['avg_outcome_score']:.1f}")
 
     col_kpi5, col_kpi6, col_kpi7, col_kpi8 = st.columns(4)
-    col_kpi5.metric("Avg Session NPS Score", f"{avg_nps_score_kpi:.1f}")
-    col_kpi6.metric("Total Clinical Sessions", f"{total_sessions_kpi:,}")
-    col_kpi7.metric("Total AI Alerts", f"{total_alerts_kpi:,}")
-    col_kpi8.metric("Alert Resolution Rate", f"{alert_resolution_rate_kpi:.1f}%")
+    col_kpi5.metric("Avg Session NPS Score", f"{kpis['avg_nps_score']:.1f}")
+    col_kpi6.metric("Total Clinical Sessions", f"{kpis['total_sessions']:,}")
+    col_kpi7.metric("Total AI Alerts", f"{kpis['total_alerts']:,}")
+    col_kpi8.metric("Alert Resolution Rate", f"{kpis['alert_resolution_rate']:.1f}%")
 
     st.markdown("---")
     st.subheader("User Distribution by Condition & Gender")
@@ -177,19 +498,16 @@ with tab1:
 
     with col_dist1:
         if 'condition' in filtered_users.columns and not filtered_users['condition'].empty:
-            condition_counts = filtered_users['condition'].value_counts().reset_index()
-            condition_counts.columns = ['Condition', 'Count']
-            fig_condition = px.bar(condition_counts, x='Condition', y='Count', title='Users by Condition', text='Count')
-            fig_condition.update_traces(texttemplate='%{text}', textposition='outside')
+            condition_counts = summarize_condition_counts(*filters)
+            fig_condition = build_figure(summary_key(condition_counts), 'bar', condition_counts, x='Condition', y='Count', title='Users by Condition', text='Count', texttemplate='%{text}')
             st.plotly_chart(fig_condition, use_container_width=True)
         else:
             st.info("No condition data available for distribution.")
 
     with col_dist2:
         if 'gender' in filtered_users.columns and not filtered_users['gender'].empty:
-            gender_counts = filtered_users['gender'].value_counts().reset_index()
-            gender_counts.columns = ['Gender', 'Count']
-            fig_gender = px.pie(gender_counts, values='Count', names='Gender', title='Users by Gender', hole=0.3)
+            gender_counts = summarize_gender_counts(*filters)
+            fig_gender = build_figure(summary_key(gender_counts), 'pie', gender_counts, values='Count', names='Gender', title='Users by Gender', hole=0.3)
             st.plotly_chart(fig_gender, use_container_width=True)
         else:
             st.info("No gender data available for distribution.")
@@ -203,7 +521,9 @@ with tab2:
     with col_engage1:
         st.subheader("Distribution of Average Daily Steps")
         if not filtered_engagement.empty and 'avg_steps' in filtered_engagement.columns:
-            fig_steps_hist = px.histogram(filtered_engagement, x="avg_steps", nbins=30, title="Distribution of Average Daily Steps")
+            steps_histogram = summarize_steps_histogram(*filters)
+            fig_steps_hist = build_figure(summary_key(steps_histogram), 'bar', steps_histogram, x="avg_steps", y="count", title="Distribution of Average Daily Steps",
+                                          layout={'bargap': 0})
             st.plotly_chart(fig_steps_hist, use_container_width=True)
         else:
             st.info("No engagement data (avg_steps) available for this view.")
@@ -211,18 +531,10 @@ with tab2:
     with col_engage2:
         st.subheader("Dropout Risk Distribution")
         if not filtered_engagement.empty and 'dropout_risk' in filtered_engagement.columns:
-            # Categorize dropout risk for better visualization
-            bins = [0, 0.25, 0.5, 0.75, 1.0]
-            labels = ['Low Risk', 'Moderate Risk', 'High Risk', 'Very High Risk']
-            filtered_engagement['risk_category'] = pd.cut(filtered_engagement['dropout_risk'], bins=bins, labels=labels, right=False)
-            
-            risk_counts = filtered_engagement['risk_category'].value_counts().reset_index()
-            risk_counts.columns = ['Risk Category', 'Count']
-            risk_counts['Risk Category'] = pd.Categorical(risk_counts['Risk Category'], categories=labels, ordered=True) # Ensure order
-            risk_counts = risk_counts.sort_values('Risk Category')
-
-            fig_risk_pie = px.pie(risk_counts, values='Count', names='Risk Category', title='Dropout Risk Distribution', hole=0.4,
-                                  color_discrete_map={'Low Risk':'#2ecc71', 'Moderate Risk':'#f1c40f', 'High Risk':'#e67e22', 'Very High Risk':'#e74c3c'})
+            risk_counts = summarize_risk_counts(*filters)
+
+            fig_risk_pie = build_figure(summary_key(risk_counts), 'pie', risk_counts, values='Count', names='Risk Category', title='Dropout Risk Distribution', hole=0.4,
+                                        color_discrete_map={'Low Risk':'#2ecc71', 'Moderate Risk':'#f1c40f', 'High Risk':'#e67e22', 'Very High Risk':'#e74c3c'})
             st.plotly_chart(fig_risk_pie, use_container_width=True)
         else:
             st.info("No engagement data (dropout_risk) available for this view.")
@@ -230,24 +542,15 @@ with tab2:
     st.markdown("---")
     st.subheader("Engagement Metrics by User Condition")
     if not filtered_engagement.empty and 'user_id' in filtered_engagement.columns and 'condition' in filtered_users.columns:
-        # Merge engagement with user conditions for this analysis
-        engagement_with_condition = pd.merge(filtered_engagement, filtered_users[['user_id', 'condition']], on='user_id', how='left')
-        
-        if not engagement_with_condition.empty and 'avg_steps' in engagement_with_condition.columns and 'dropout_risk' in engagement_with_condition.columns:
-            avg_metrics_by_condition = engagement_with_condition.groupby('condition').agg(
-                avg_steps=('avg_steps', 'mean'),
-                avg_dropout_risk=('dropout_risk', 'mean'),
-                user_count=('user_id', 'nunique')
-            ).reset_index()
+        avg_metrics_by_condition = summarize_engagement_by_condition(*filters)
 
+        if avg_metrics_by_condition is not None:
             col_cond_engage1, col_cond_engage2 = st.columns(2)
             with col_cond_engage1:
-                fig_steps_by_cond = px.bar(avg_metrics_by_condition, x='condition', y='avg_steps', title='Avg Daily Steps by Condition', text='avg_steps')
-                fig_steps_by_cond.update_traces(texttemplate='%{text:.0f}', textposition='outside')
+                fig_steps_by_cond = build_figure(summary_key(avg_metrics_by_condition), 'bar', avg_metrics_by_condition, x='condition', y='avg_steps', title='Avg Daily Steps by Condition', text='avg_steps', texttemplate='%{text:.0f}')
                 st.plotly_chart(fig_steps_by_cond, use_container_width=True)
             with col_cond_engage2:
-                fig_risk_by_cond = px.bar(avg_metrics_by_condition, x='condition', y='avg_dropout_risk', title='Avg Dropout Risk by Condition', text='avg_dropout_risk')
-                fig_risk_by_cond.update_traces(texttemplate='%{text:.2f}', textposition='outside')
+                fig_risk_by_cond = build_figure(summary_key(avg_metrics_by_condition), 'bar', avg_metrics_by_condition, x='condition', y='avg_dropout_risk', title='Avg Dropout Risk by Condition', text='avg_dropout_risk', texttemplate='%{text:.2f}')
                 st.plotly_chart(fig_risk_by_cond, use_container_width=True)
         else:
             st.info("Engagement metrics by condition not available for display.")
@@ -260,21 +563,15 @@ with tab3:
 
     st.subheader("Average Outcome & NPS Score by Session Type")
     if not filtered_sessions.empty and 'session_type' in filtered_sessions.columns:
-        sess_summary = filtered_sessions.groupby("session_type").agg({
-            "outcome_score": "mean",
-            "nps_score": "mean",
-            "user_id": "nunique" # Count users per session type
-        }).reset_index()
-        sess_summary.columns = ["session_type", "Average Outcome Score", "Average NPS Score", "Unique Users"]
-        
+        sess_summary = summarize_session_types(*filters)
+
         col_sess_summ1, col_sess_summ2 = st.columns(2)
         with col_sess_summ1:
-            fig2 = px.bar(sess_summary, x="session_type", y=["Average Outcome Score", "Average NPS Score"], barmode="group",
-                            title="Average Outcome & NPS Score by Session Type")
+            fig2 = build_figure(summary_key(sess_summary), 'bar', sess_summary, x="session_type", y=["Average Outcome Score", "Average NPS Score"], barmode="group",
+                                title="Average Outcome & NPS Score by Session Type")
             st.plotly_chart(fig2, use_container_width=True)
         with col_sess_summ2:
-            fig_sess_users = px.bar(sess_summary, x="session_type", y="Unique Users", title="Unique Users by Session Type", text="Unique Users")
-            fig_sess_users.update_traces(texttemplate='%{text}', textposition='outside')
+            fig_sess_users = build_figure(summary_key(sess_summary), 'bar', sess_summary, x="session_type", y="Unique Users", title="Unique Users by Session Type", text="Unique Users", texttemplate='%{text}')
             st.plotly_chart(fig_sess_users, use_container_width=True)
     else:
         st.info("No session data available for outcome and NPS analysis.")
@@ -282,8 +579,8 @@ with tab3:
     st.markdown("---")
     st.subheader("Sessions Over Time")
     if not filtered_sessions.empty and 'session_date' in filtered_sessions.columns:
-        sessions_daily = filtered_sessions.groupby(pd.Grouper(key='session_date', freq='D')).size().reset_index(name='Count')
-        fig_sessions_trend = px.line(sessions_daily, x='session_date', y='Count', title='Daily Clinical Sessions Trend')
+        sessions_daily = summarize_sessions_daily(*filters)
+        fig_sessions_trend = build_figure(summary_key(sessions_daily), 'line', sessions_daily, x='session_date', y='Count', title='Daily Clinical Sessions Trend')
         st.plotly_chart(fig_sessions_trend, use_container_width=True)
     else:
         st.info("No session data or date information for trend analysis.")
@@ -294,16 +591,11 @@ with tab4:
 
     st.subheader("Alert Resolution Rate by Type")
     if not filtered_alerts.empty and 'alert_type' in filtered_alerts.columns:
-        alerts_summary = filtered_alerts.groupby("alert_type").agg(
-            total_alerts=("user_id", "count"), # Count total alerts
-            resolved_alerts=("resolved", "sum") # Sum of resolved (assuming 'resolved' is 0/1)
-        ).reset_index()
-        alerts_summary['resolution_rate'] = (alerts_summary['resolved_alerts'] / alerts_summary['total_alerts'] * 100)
-        
+        alerts_summary = summarize_alert_types(*filters)
+
         col_alert1, col_alert2 = st.columns(2)
         with col_alert1:
-            fig3 = px.bar(alerts_summary, x="alert_type", y="resolution_rate", title="Alert Resolution Rate by Type", text="resolution_rate")
-            fig3.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
+            fig3 = build_figure(summary_key(alerts_summary), 'bar', alerts_summary, x="alert_type", y="resolution_rate", title="Alert Resolution Rate by Type", text="resolution_rate", texttemplate='%{text:.1f}%')
             st.plotly_chart(fig3, use_container_width=True)
         
         with col_alert2:
@@ -316,8 +608,8 @@ with tab4:
                 'Status': ['Resolved', 'Unresolved'],
                 'Count': [overall_resolved_count, overall_unresolved_count]
             })
-            fig_overall_res = px.pie(overall_resolution_data, values='Count', names='Status', title='Overall Alert Resolution Status', hole=0.4,
-                                     color_discrete_map={'Resolved':'#2ecc71', 'Unresolved':'#e74c3c'})
+            fig_overall_res = build_figure(summary_key(overall_resolution_data), 'pie', overall_resolution_data, values='Count', names='Status', title='Overall Alert Resolution Status', hole=0.4,
+                                           color_discrete_map={'Resolved':'#2ecc71', 'Unresolved':'#e74c3c'})
             st.plotly_chart(fig_overall_res, use_container_width=True)
     else:
         st.info("No alert data available for resolution analysis.")
@@ -325,8 +617,8 @@ with tab4:
     st.markdown("---")
     st.subheader("Alerts Over Time")
     if not filtered_alerts.empty and 'alert_date' in filtered_alerts.columns:
-        alerts_daily = filtered_alerts.groupby(pd.Grouper(key='alert_date', freq='D')).size().reset_index(name='Count')
-        fig_alerts_trend = px.line(alerts_daily, x='alert_date', y='Count', title='Daily AI Alerts Trend')
+        alerts_daily = summarize_alerts_daily(*filters)
+        fig_alerts_trend = build_figure(summary_key(alerts_daily), 'line', alerts_daily, x='alert_date', y='Count', title='Daily AI Alerts Trend')
         st.plotly_chart(fig_alerts_trend, use_container_width=True)
     else:
         st.info("No alert data or date information for trend analysis.")
@@ -334,14 +626,10 @@ with tab4:
     st.markdown("---")
     st.subheader("Alerts by User Condition")
     if not filtered_alerts.empty and 'user_id' in filtered_alerts.columns and 'condition' in filtered_users.columns:
-        alerts_with_condition = pd.merge(filtered_alerts, filtered_users[['user_id', 'condition']], on='user_id', how='left')
-        
-        if not alerts_with_condition.empty and 'condition' in alerts_with_condition.columns:
-            alert_counts_by_condition = alerts_with_condition.groupby('condition')['user_id'].count().reset_index()
-            alert_counts_by_condition.columns = ['Condition', 'Total Alerts']
-            
-            fig_alerts_by_cond = px.bar(alert_counts_by_condition, x='Condition', y='Total Alerts', title='Total Alerts by User Condition', text='Total Alerts')
-            fig_alerts_by_cond.update_traces(texttemplate='%{text}', textposition='outside')
+        alert_counts_by_condition = summarize_alerts_by_condition(*filters)
+
+        if alert_counts_by_condition is not None:
+            fig_alerts_by_cond = build_figure(summary_key(alert_counts_by_condition), 'bar', alert_counts_by_condition, x='Condition', y='Total Alerts', title='Total Alerts by User Condition', text='Total Alerts', texttemplate='%{text}')
             st.plotly_chart(fig_alerts_by_cond, use_container_width=True)
         else:
             st.info("Alerts by user condition not available for display.")
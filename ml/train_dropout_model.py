@@ -1,12 +1,19 @@
+import numpy as np
 import pandas as pd
 import torch
 from torch import nn
 from sklearn.model_selection import train_test_split
 import mlflow
 
-df = pd.read_csv('data/ml_engagement_training_data.csv')
-X = df[['age', 'active_days', 'avg_steps']].values
-y = df['dropout_risk'].values.astype(float)
+# Only parse the columns the model uses, with explicit dtypes to skip inference
+df = pd.read_csv(
+    'data/ml_engagement_training_data.csv',
+    usecols=['age', 'active_days', 'avg_steps', 'dropout_risk'],
+    dtype={'age': 'int32', 'active_days': 'int32', 'avg_steps': 'float32', 'dropout_risk': 'float32'},
+)
+# Read straight into float32 so tensor construction needs no cast or copy
+X = df[['age', 'active_days', 'avg_steps']].to_numpy(dtype=np.float32)
+y = df['dropout_risk'].to_numpy(dtype=np.float32).reshape(-1, 1)
 X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2)
 
 class DropoutRiskNN(nn.Module):
@@ -15,26 +22,26 @@ class DropoutRiskNN(nn.Module):
         self.fc = nn.Sequential(
             nn.Linear(3, 8),
             nn.ReLU(),
-            nn.Linear(8, 1),
-            nn.Sigmoid()
+            nn.Linear(8, 1)
         )
     def forward(self, x):
         return self.fc(x)
 
-model = DropoutRiskNN()
-loss_fn = nn.BCELoss()
+device = 'cuda' if torch.cuda.is_available() else 'cpu'
+model = DropoutRiskNN().to(device)
+loss_fn = nn.BCEWithLogitsLoss() # Fuses the sigmoid into the loss; the model outputs logits
 optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
 
-X_tensor = torch.tensor(X_train, dtype=torch.float32)
-y_tensor = torch.tensor(y_train.reshape(-1, 1), dtype=torch.float32)
+X_tensor = torch.from_numpy(X_train).to(device)
+y_tensor = torch.from_numpy(y_train).to(device)
 
 with mlflow.start_run():
     for epoch in range(100):
-        optimizer.zero_grad()
+        optimizer.zero_grad(set_to_none=True)
         output = model(X_tensor)
         loss = loss_fn(output, y_tensor)
         loss.backward()
         optimizer.step()
 
     mlflow.log_metric("final_loss", loss.item())
-    torch.save(model.state_dict(), 'ml/dropout_model.pt')
\ No newline at end of file
+    torch.save({k: v.cpu() for k, v in model.state_dict().items()}, 'ml/dropout_model.pt')
\ No newline at end of file
@@ -1,13 +1,24 @@
 
 import luigi
 import os
+import hashlib
 import subprocess
+import numpy as np
 import pandas as pd
 import torch
 from torch import nn
 from sklearn.model_selection import train_test_split
 import mlflow
 
+TRAINING_DATA = 'data/ml_engagement_training_data.csv'
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
 class RunDbtModels(luigi.Task):
     def output(self):
         return luigi.LocalTarget('models_run.txt')
@@ -24,10 +35,30 @@ class TrainEngagementModel(luigi.Task):
     def output(self):
         return luigi.LocalTarget('ml_model.pt')
 
+    def hash_path(self):
+        return self.output().path + '.sha256'
+
+    def complete(self):
+        # The model is only up to date if it was trained on the current training CSV
+        if not self.output().exists() or not os.path.exists(self.hash_path()):
+            return False
+        # A missing training CSV is left for run() to report as a normal task failure
+        if not os.path.exists(TRAINING_DATA):
+            return False
+        with open(self.hash_path()) as f:
+            return f.read().strip() == file_sha256(TRAINING_DATA)
+
     def run(self):
-        df = pd.read_csv('data/ml_engagement_training_data.csv')
-        X = df[['age', 'active_days', 'avg_steps']].values
-        y = df['dropout_risk'].values.astype(float)
+        data_hash = file_sha256(TRAINING_DATA)
+        # Only parse the columns the model uses, with explicit dtypes to skip inference
+        df = pd.read_csv(
+            TRAINING_DATA,
+            usecols=['age', 'active_days', 'avg_steps', 'dropout_risk'],
+            dtype={'age': 'int32', 'active_days': 'int32', 'avg_steps': 'float32', 'dropout_risk': 'float32'},
+        )
+        # Read straight into float32 so tensor construction needs no cast or copy
+        X = df[['age', 'active_days', 'avg_steps']].to_numpy(dtype=np.float32)
+        y = df['dropout_risk'].to_numpy(dtype=np.float32).reshape(-1, 1)
         X_train, _, y_train, _ = train_test_split(X, y, test_size=0.2)
 
         class SimpleNN(nn.Module):
@@ -36,30 +67,32 @@ class TrainEngagementModel(luigi.Task):
                 self.fc = nn.Sequential(
                     nn.Linear(3, 8),
                     nn.ReLU(),
-                    nn.Linear(8, 1),
-                    nn.Sigmoid()
+                    nn.Linear(8, 1)
                 )
 
             def forward(self, x):
                 return self.fc(x)
 
-        model = SimpleNN()
-        loss_fn = nn.BCELoss()
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        model = SimpleNN().to(device)
+        loss_fn = nn.BCEWithLogitsLoss() # Fuses the sigmoid into the loss; the model outputs logits
         optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
 
-        X_tensor = torch.tensor(X_train, dtype=torch.float32)
-        y_tensor = torch.tensor(y_train.reshape(-1, 1), dtype=torch.float32)
+        X_tensor = torch.from_numpy(X_train).to(device)
+        y_tensor = torch.from_numpy(y_train).to(device)
 
         with mlflow.start_run():
             for epoch in range(100):
-                optimizer.zero_grad()
+                optimizer.zero_grad(set_to_none=True)
                 output = model(X_tensor)
                 loss = loss_fn(output, y_tensor)
                 loss.backward()
                 optimizer.step()
 
             mlflow.log_metric("final_loss", loss.item())
-            torch.save(model.state_dict(), self.output().path)
+            torch.save({k: v.cpu() for k, v in model.state_dict().items()}, self.output().path)
+            with open(self.hash_path(), 'w') as f:
+                f.write(data_hash)
 
 class FullPipeline(luigi.WrapperTask):
     def requires(self):